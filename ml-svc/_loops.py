@@ -0,0 +1,95 @@
+"""Compiled inner loops for the backtests in app.py.
+
+Numba is optional: without it ``njit`` is a no-op, the backtest kernel is
+swapped for a vectorised NumPy equivalent and the rest run as plain Python
+over the same arrays.
+"""
+import math
+
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # pragma: no cover
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        def decorator(fn):
+            return fn
+        return decorator
+
+
+@njit(cache=True)
+def _equity_from_signal_jit(close, signal):
+    """Equity curve, annualised Sharpe and max drawdown in one pass.
+
+    The position held on bar i is ``signal[i]`` (1.0 long, 0.0 flat). Return
+    mean/variance use Welford's update so no second pass is needed.
+    """
+    n = close.shape[0]
+    equity = np.empty(max(n, 1))
+    equity[0] = 1.0
+    mean = 0.0
+    m2 = 0.0
+    peak = equity[0]
+    maxdd = 0.0
+    for i in range(1, n):
+        prev = close[i-1]
+        r = (close[i] - prev) / (prev if prev != 0.0 else 1.0)
+        equity[i] = equity[i-1] * (1.0 + signal[i] * r)
+        ret = equity[i] / equity[i-1] - 1.0
+        delta = ret - mean
+        mean += delta / i
+        m2 += delta * (ret - mean)
+        if equity[i] > peak:
+            peak = equity[i]
+        dd = equity[i] / peak - 1.0
+        if dd < maxdd:
+            maxdd = dd
+    sharpe = 0.0
+    if n > 1:
+        sd = math.sqrt(m2 / (n - 1))
+        sharpe = mean / (sd if sd != 0.0 else 1e-9) * math.sqrt(252.0)
+    return equity, sharpe, maxdd
+
+
+def _equity_from_signal_np(close, signal):
+    """Vectorised form of the kernel above: NumPy C loops, no per-bar Python."""
+    if close.shape[0] < 2:
+        return np.ones(1), 0.0, 0.0
+    prev = close[:-1]
+    r = signal[1:] * (np.diff(close) / np.where(prev != 0.0, prev, 1.0))
+    equity = np.concatenate(([1.0], np.cumprod(1.0 + r)))
+    rets = equity[1:] / equity[:-1] - 1.0
+    sd = rets.std()
+    sharpe = rets.mean() / (sd if sd != 0.0 else 1e-9) * math.sqrt(252.0)
+    maxdd = min(0.0, float((equity / np.maximum.accumulate(equity) - 1.0).min()))
+    return equity, float(sharpe), maxdd
+
+
+_equity_from_signal = _equity_from_signal_jit if HAVE_NUMBA else _equity_from_signal_np
+
+
+@njit(cache=True)
+def _ema_last(x, k):
+    """Final value of the EMA recurrence, without materialising the series."""
+    ema = x[0]
+    for i in range(1, x.shape[0]):
+        ema = (x[i] - ema) * k + ema
+    return ema
+
+
+def warmup():
+    """Trigger JIT compilation so the first request doesn't pay for it.
+
+    Numba types read-only arrays separately, and the memoized closes app.py
+    hands out are read-only, so compile that signature as well.
+    """
+    ro = np.ones(2)
+    ro.setflags(write=False)
+    for x in (np.ones(2), ro):
+        _equity_from_signal(x, np.zeros(2))
+        _ema_last(x, 0.5)
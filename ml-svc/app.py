@@ -1,14 +1,54 @@
 from fastapi import FastAPI, Body
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import os
-import math
-import statistics
-import requests
+import asyncio
+import time
+import importlib.util
+from collections import OrderedDict
+import httpx
+import numpy as np
+import orjson
+from numpy.lib.stride_tricks import sliding_window_view
+
+from _loops import _ema_last, _equity_from_signal, warmup as _warmup_loops
 
 SERVER_BASE = os.getenv('SERVER_BASE_URL', 'http://localhost:4010')
 
-app = FastAPI(title="ML Service", version="0.1.0")
+_CLIENT: Optional[httpx.AsyncClient] = None
+
+def _client() -> httpx.AsyncClient:
+    # One pooled client shared by every request; created lazily inside the
+    # running event loop. HTTP/2 is used when the optional `h2` package is present.
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = httpx.AsyncClient(
+            base_url=SERVER_BASE,
+            timeout=10.0,
+            http2=importlib.util.find_spec('h2') is not None,
+            limits=httpx.Limits(max_keepalive_connections=32),
+        )
+    return _CLIENT
+
+class ORJSONResponse(JSONResponse):
+    # orjson formats numbers in C and serializes NumPy arrays straight from
+    # their buffer, so equity curves never become lists of Python floats.
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+app = FastAPI(title="ML Service", version="0.1.0", default_response_class=ORJSONResponse)
+
+@app.on_event("startup")
+def _warmup():
+    _warmup_loops()
+
+@app.on_event("shutdown")
+async def _shutdown():
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
 
 class BacktestConfig(BaseModel):
     symbols: List[str] = []
@@ -17,145 +57,160 @@ class BacktestConfig(BaseModel):
     strategy: str = "ma_crossover"
     params: Dict[str, Any] = {}
 
-def _get_history(symbol: str, days: int = 365):
+# symbol -> (fetched_at, closes). The upstream history endpoint returns the
+# same series whatever `days` a caller wants, so one entry serves every window.
+# Entries live for ML_HISTORY_TTL seconds; the oldest symbols are evicted past
+# _HISTORY_MEMO_SIZE.
+_HISTORY_MEMO: "OrderedDict[str, tuple]" = OrderedDict()
+_HISTORY_MEMO_SIZE = 512
+_HISTORY_TTL = float(os.getenv('ML_HISTORY_TTL', '600'))
+
+async def _get_history(symbol: str, days: int = 365):
+    now = time.monotonic()
+    hit = _HISTORY_MEMO.get(symbol)
+    if hit is not None and now - hit[0] < _HISTORY_TTL:
+        _HISTORY_MEMO.move_to_end(symbol)
+        return hit[1][-days:]
     try:
-        r = requests.get(f"{SERVER_BASE}/api/stocks/{symbol}/history", timeout=10)
+        r = await _client().get(f"/api/stocks/{symbol}/history")
         r.raise_for_status()
         js = r.json()
         data = js.get('data', [])
-        closes = [float(row.get('close')) for row in data][-days:]
-        return closes
+        closes = np.array([float(row.get('close')) for row in data], dtype=np.float64)
     except Exception:
-        return []
-
-def _sma(arr, n):
-    out = []
-    s = 0.0
-    q = []
-    for v in arr:
-        q.append(v)
-        s += v
-        if len(q) > n:
-            s -= q.pop(0)
-        out.append(s/len(q))
-    return out
+        return np.empty(0)
+    # Shared between callers, so read-only (slices inherit the flag).
+    closes.setflags(write=False)
+    _HISTORY_MEMO[symbol] = (now, closes)
+    _HISTORY_MEMO.move_to_end(symbol)
+    if len(_HISTORY_MEMO) > _HISTORY_MEMO_SIZE:
+        _HISTORY_MEMO.popitem(last=False)
+    return closes[-days:]
 
-def _ema(arr, n):
-    out = []
-    k = 2/(n+1)
-    ema = None
-    for v in arr:
-        ema = (v if ema is None else (v - ema) * k + ema)
-        out.append(ema)
-    return out
+def _cumsum(arr):
+    return np.concatenate(([0.0], np.cumsum(np.asarray(arr, dtype=np.float64))))
+
+def _sma_from_cumsum(csum, n):
+    # Trailing mean over the last n values; the first n-1 points average the
+    # shorter prefix seen so far. Any number of windows can share one csum.
+    hi = np.arange(1, csum.size)
+    lo = np.maximum(hi - n, 0)
+    return (csum[1:] - csum[lo]) / (hi - lo)
 
 def _rsi(arr, n=14):
-    gains = []
-    losses = []
-    rsis = []
-    prev = None
-    for v in arr:
-        if prev is None:
-            gains.append(0.0); losses.append(0.0)
-        else:
-            ch = v - prev
-            gains.append(max(0.0, ch))
-            losses.append(max(0.0, -ch))
-        prev = v
-        if len(gains) < n:
-            rsis.append(50.0)
-        else:
-            ag = sum(gains[-n:]) / n
-            al = sum(losses[-n:]) / n
-            rs = (ag / al) if al != 0 else 0
-            rsi = 100 - (100/(1+rs))
-            rsis.append(rsi)
-    return rsis
+    x = np.asarray(arr, dtype=np.float64)
+    out = np.full(x.size, 50.0)
+    if x.size < n:
+        return out
+    d = np.diff(x, prepend=x[:1])
+    # Windowed sums (not cumsum differences) so an all-flat window stays exactly 0.
+    ag = sliding_window_view(np.maximum(d, 0.0), n).sum(axis=1) / n
+    al = sliding_window_view(np.maximum(-d, 0.0), n).sum(axis=1) / n
+    rs = np.divide(ag, al, out=np.zeros_like(ag), where=al != 0)
+    out[n-1:] = 100 - (100/(1+rs))
+    return out
+
+def _sma_tail(arr, n):
+    # Last value of the n-bar SMA without building the series.
+    return float(np.mean(arr[-n:]))
+
+def _ema_tail(arr, n):
+    # Last value of the n-bar EMA (alpha 2/(n+1)) without building the series.
+    return float(_ema_last(np.asarray(arr, dtype=np.float64), 2/(n+1)))
+
+def _ret_tail(arr, n):
+    # Last n-bar return, 0.0 until there are more than n bars.
+    if len(arr) <= n:
+        return 0.0
+    base = arr[-n-1]
+    return float((arr[-1] - base) / (base or 1))
+
+def _vol_tail(arr, days):
+    # Population stdev of the last `days` 1-bar returns. Only that window is
+    # differenced; with a short history the leading 0.0 return is kept, as before.
+    if 0 < days < len(arr):
+        w = arr[-days-1:]
+        ret1 = np.diff(w) / np.where(w[:-1] != 0, w[:-1], 1.0)
+    else:
+        ret1 = np.concatenate(([0.0], np.diff(arr) / np.where(arr[:-1] != 0, arr[:-1], 1.0)))
+    return float(ret1.std())
 
 @app.get("/features")
-def features(symbol: str, days: int = 60):
-    closes = _get_history(symbol, max(60, days+60))
-    if not closes:
+async def features(symbol: str, days: int = 60):
+    closes = await _get_history(symbol, max(60, days+60))
+    if closes.size == 0:
         return {"ok": True, "data": {"symbol": symbol, "days": days, "features": None, "note": "no history"}}
-    ret1 = [0.0] + [ (closes[i]-closes[i-1])/(closes[i-1] or 1) for i in range(1,len(closes)) ]
-    ret5 = [0.0]*5 + [ (closes[i]-closes[i-5])/(closes[i-5] or 1) for i in range(5,len(closes)) ]
-    ret20 = [0.0]*20 + [ (closes[i]-closes[i-20])/(closes[i-20] or 1) for i in range(20,len(closes)) ]
-    vol = statistics.pstdev(ret1[-days:]) if len(ret1) >= days else statistics.pstdev(ret1)
-    sma20 = _sma(closes, 20)[-1]
-    ema50 = _ema(closes, 50)[-1]
+    vol = _vol_tail(closes, days)
+    sma20 = _sma_tail(closes, 20)
+    ema50 = _ema_tail(closes, 50)
     mom = (closes[-1] - closes[-min(len(closes), 20)]) / (closes[-min(len(closes), 20)] or 1)
     rsi = _rsi(closes, 14)[-1]
-    feats = {"ret1": ret1[-1], "ret5": ret5[-1], "ret20": ret20[-1], "vol": vol, "sma20": sma20, "ema50": ema50, "momentum": mom, "rsi": rsi}
+    feats = {"ret1": _ret_tail(closes, 1), "ret5": _ret_tail(closes, 5), "ret20": _ret_tail(closes, 20), "vol": vol, "sma20": sma20, "ema50": ema50, "momentum": mom, "rsi": rsi}
     return {"ok": True, "data": {"symbol": symbol, "days": days, "features": feats}}
 
 @app.post("/predict/{symbol}")
-def predict(symbol: str, body: Dict[str, Any] = Body(default={})):
+async def predict(symbol: str, body: Dict[str, Any] = Body(default={})):
     horizon = int(body.get("horizon", 1))
-    closes = _get_history(symbol, 200)
-    if not closes:
+    closes = await _get_history(symbol, 200)
+    if closes.size == 0:
         return {"ok": True, "data": {"symbol": symbol, "horizon": horizon, "prediction": None, "confidence": 0.0, "note": "no history"}}
-    s20 = _sma(closes, 20)[-1]
-    s50 = _sma(closes, 50)[-1]
+    s20 = _sma_tail(closes, 20)
+    s50 = _sma_tail(closes, 50)
     direction = 1 if s20 >= s50 else -1
     pred = closes[-1] * (1 + 0.002 * direction * max(1, min(5, horizon)))
     conf = 0.55 if direction == 1 else 0.45
     return {"ok": True, "data": {"symbol": symbol, "horizon": horizon, "prediction": pred, "confidence": conf, "model": "sma_crossover"}}
 
+def _momentum(arr, n=20):
+    x = np.asarray(arr, dtype=np.float64)
+    mom = np.zeros(x.size)
+    if x.size > n:
+        base = x[:-n]
+        mom[n:] = (x[n:] - base) / np.where(base == 0, 1.0, base)
+    return mom
+
 def _backtest_ma_crossover(closes, fast=20, slow=50):
-    fasts = _sma(closes, fast)
-    slows = _sma(closes, slow)
-    pos = 0
-    equity = [1.0]
-    for i in range(1, len(closes)):
-        if fasts[i] >= slows[i]:
-            pos = 1
-        else:
-            pos = 0
-        r = (closes[i] - closes[i-1])/(closes[i-1] or 1)
-        equity.append(equity[-1] * (1 + pos * r))
-    returns = [equity[i]/equity[i-1]-1 for i in range(1,len(equity))]
-    sharpe = (statistics.mean(returns) / (statistics.pstdev(returns) or 1e-9)) * math.sqrt(252) if returns else 0.0
-    peak = equity[0]
-    maxdd = 0.0
-    for v in equity:
-        peak = max(peak, v)
-        dd = (v/peak) - 1.0
-        maxdd = min(maxdd, dd)
-    return equity, {"sharpe": sharpe, "maxdd": maxdd}
+    arr = np.asarray(closes, dtype=np.float64)
+    return _backtest_ma_crossover_prebuilt(arr, _cumsum(arr), fast, slow)
+
+def _backtest_ma_crossover_prebuilt(arr, csum, fast, slow):
+    # csum may be a slice of a longer series' prefix sum (csum[start:end+1]);
+    # the SMAs only use differences, so the offset cancels out.
+    signal = (_sma_from_cumsum(csum, fast) >= _sma_from_cumsum(csum, slow)).astype(np.float64)
+    equity, sharpe, maxdd = _equity_from_signal(arr, signal)
+    return equity.astype(np.float32), {"sharpe": float(sharpe), "maxdd": float(maxdd)}
+
+def _backtest_momentum(closes, n=20):
+    # simple momentum: invest if n-bar momentum positive
+    arr = np.asarray(closes, dtype=np.float64)
+    signal = (_momentum(arr, n) > 0).astype(np.float64)
+    equity, sharpe, maxdd = _equity_from_signal(arr, signal)
+    return equity.astype(np.float32), {"sharpe": float(sharpe), "maxdd": float(maxdd)}
+
+def _run_backtest(closes, strategy, params):
+    if strategy == 'momentum':
+        return _backtest_momentum(closes)
+    return _backtest_ma_crossover(closes, int(params.get('fast', 20)), int(params.get('slow', 50)))
 
 @app.post("/backtest")
-def backtest(cfg: BacktestConfig):
+async def backtest(cfg: BacktestConfig):
     symbols = cfg.symbols or []
     if not symbols:
         return {"ok": True, "data": {"id": "bt-0001", "status": "done", "metrics": {}, "equity": []}}
-    closes = _get_history(symbols[0], 400)
-    if not closes:
-        return {"ok": True, "data": {"id": "bt-0001", "status": "done", "metrics": {}, "equity": []}}
-    if cfg.strategy == 'momentum':
-        # simple momentum: invest if 20-bar momentum positive
-        mom = [(closes[i]-closes[i-20])/(closes[i-20] or 1) if i>=20 else 0 for i in range(len(closes))]
-        pos = 0
-        equity = [1.0]
-        for i in range(1,len(closes)):
-            pos = 1 if mom[i] > 0 else 0
-            r = (closes[i]-closes[i-1])/(closes[i-1] or 1)
-            equity.append(equity[-1]*(1+pos*r))
-        returns = [equity[i]/equity[i-1]-1 for i in range(1,len(equity))]
-        sharpe = (statistics.mean(returns) / (statistics.pstdev(returns) or 1e-9)) * math.sqrt(252) if returns else 0.0
-        peak = 1.0
-        maxdd = 0.0
-        for v in equity:
-            peak = max(peak, v)
-            dd = (v/peak) - 1.0
-            maxdd = min(maxdd, dd)
-        metrics = {"sharpe": sharpe, "maxdd": maxdd}
-        return {"ok": True, "data": {"id": "bt-0001", "status": "done", "metrics": metrics, "equity": equity}}
-    else:
-        equity, metrics = _backtest_ma_crossover(closes, int(cfg.params.get('fast', 20)), int(cfg.params.get('slow', 50)))
-        return {"ok": True, "data": {"id": "bt-0001", "status": "done", "metrics": metrics, "equity": equity}}
+    # Overlap the history fetches; each backtest then runs inline (~25us, well
+    # under the cost of handing it to another process).
+    histories = await asyncio.gather(*[_get_history(s, 400) for s in symbols])
+    results = []
+    for sym, closes in zip(symbols, histories):
+        equity, metrics = _run_backtest(closes, cfg.strategy, cfg.params) if closes.size else ([], {})
+        results.append({"symbol": sym, "metrics": metrics, "equity": equity})
+    # Top-level metrics/equity keep describing the first symbol for existing callers.
+    # Returned as a response object so the float32 arrays skip jsonable_encoder.
+    first = results[0]
+    return ORJSONResponse({"ok": True, "data": {"id": "bt-0001", "status": "done", "metrics": first["metrics"], "equity": first["equity"], "results": results}})
 
 @app.post("/walkforward/{symbol}")
-def walkforward(symbol: str, body: Dict[str, Any] = Body(default={})):
+async def walkforward(symbol: str, body: Dict[str, Any] = Body(default={})):
     """Simple walk-forward evaluation for MA crossover.
     Splits the series into k folds by time, trains params (fast/slow) fixed,
     and returns per-fold metrics and averages.
@@ -163,22 +218,28 @@ def walkforward(symbol: str, body: Dict[str, Any] = Body(default={})):
     k = int(body.get('folds', 5))
     fast = int((body.get('params') or {}).get('fast', 20))
     slow = int((body.get('params') or {}).get('slow', 50))
-    closes = _get_history(symbol, 800)
+    closes = await _get_history(symbol, 800)
     if len(closes) < (slow + 50):
         return {"ok": True, "data": {"folds": [], "avg": {"sharpe": 0.0, "maxdd": 0.0}}}
     n = len(closes)
     fold_size = max(50, n // k)
-    results = []
+    folds = []
     for i in range(k):
         start = i * fold_size
         end = min(n, (i+1) * fold_size)
         if end - start < (slow + 5):
             continue
-        seg = closes[start:end]
-        eq, met = _backtest_ma_crossover(seg, fast, slow)
-        results.append({"fold": i+1, "start": start, "end": end, "metrics": met})
-    if not results:
+        folds.append((i+1, start, end))
+    if not folds:
         return {"ok": True, "data": {"folds": [], "avg": {"sharpe": 0.0, "maxdd": 0.0}}}
+    # Folds run inline: each is ~10us with the compiled kernel, far below the
+    # pickling/IPC cost of shipping it to a worker process.
+    csum = _cumsum(closes)
+    metrics = [
+        _backtest_ma_crossover_prebuilt(closes[start:end], csum[start:end+1], fast, slow)[1]
+        for _, start, end in folds
+    ]
+    results = [{"fold": f, "start": start, "end": end, "metrics": met} for (f, start, end), met in zip(folds, metrics)]
     avg_sharpe = sum([r['metrics']['sharpe'] for r in results]) / len(results)
     avg_maxdd = sum([r['metrics']['maxdd'] for r in results]) / len(results)
     return {"ok": True, "data": {"folds": results, "avg": {"sharpe": avg_sharpe, "maxdd": avg_maxdd}}}
@@ -11,20 +11,28 @@ Usage:
       python server/scripts/yfinance_fetch.py --all [--period 6mo] [--interval 1d] [--provider yfinance|yahooquery]
     Reads symbols from server/stocklist.ts, appends Yahoo suffix (default .NS),
     fetches daily history and fundamentals, and upserts into prices + related tables.
+    Add --initial-load when populating an empty DB: price/action rows are appended
+    to unindexed staging tables and merged into the keyed tables once at the end.
 
 Environment:
   PROVIDER=yahooquery   (alternative to --provider flag)
   TICKER_YAHOO_SUFFIX / YAHOO_SUFFIX   to override suffix (.NS default)
+  YF_WORKERS=12         concurrent symbol fetches for the yfinance --all ingest
 """
 
 from __future__ import annotations
+import argparse
 import json
 import sys
 import subprocess
 import shlex
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import chain, repeat
 from typing import Any, Dict, List, Tuple
 from pathlib import Path
 import os
+import re
 import sqlite3
 
 
@@ -32,8 +40,9 @@ def ensure_deps(provider: str = "yfinance") -> None:
     """Ensure required pip dependencies are installed.
     For yahooquery provider we need yahooquery + pandas.
     For yfinance provider we need yfinance + pandas.
+    orjson is used for all JSON encoding in both modes.
     """
-    base_pkgs = ["pandas"]
+    base_pkgs = ["pandas", "orjson"]
     if provider == "yahooquery":
         pkgs = ["yahooquery"] + base_pkgs
     else:
@@ -53,83 +62,127 @@ def ensure_deps(provider: str = "yfinance") -> None:
             raise
 
 
+# Third-party modules, bound once by load_deps() after ensure_deps has run
+# (they may only just have been pip-installed, so they can't be imported at
+# the top of the file).
+orjson = None
+pd = None
+yf = None
+Ticker = None  # yahooquery.Ticker
+
+
+def load_deps(provider: str = "yfinance") -> None:
+    global orjson, pd, yf, Ticker
+    try:
+        import orjson as _orjson  # type: ignore
+        orjson = _orjson
+    except ImportError:  # pragma: no cover
+        orjson = None
+    import pandas as _pd  # type: ignore
+    pd = _pd
+    if provider == "yahooquery":
+        from yahooquery import Ticker as _Ticker  # type: ignore
+        Ticker = _Ticker
+    else:
+        import yfinance as _yf  # type: ignore
+        yf = _yf
+
+
+def dumpb(obj: Any) -> bytes:
+    """JSON-encode to UTF-8 bytes via orjson (C encoder; numpy scalars/arrays,
+    NaN -> null) when available, else stdlib json. Non-native values fall back
+    to str()."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    if orjson is not None:
+        return dumpb(obj).decode()
+    return json.dumps(obj, ensure_ascii=False, default=str)
+
+
+def write_json(obj: Any) -> None:
+    """Write obj as one JSON line straight to stdout's byte stream, skipping
+    the str decode/re-encode print() would do on large single-symbol payloads."""
+    buf = getattr(sys.stdout, "buffer", None)
+    if buf is None:
+        print(dumps(obj))
+        return
+    sys.stdout.flush()
+    buf.write(dumpb(obj))
+    buf.write(b"\n")
+    buf.flush()
+
+
+def loads(data: str | bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
 def fail(msg: str, code: int = 1) -> None:
     print(json.dumps({"ok": False, "error": msg}), file=sys.stderr)
     sys.exit(code)
 
 
+def _records_with_date(df) -> List[Dict[str, Any]]:
+    """Records led by a "date" key taken from the index, without copying `df`
+    to insert a column. NaN -> None, as in df_records.
+    """
+    dates = df.index.astype(str).tolist()
+    cols = df.columns.tolist()
+    values = df.to_numpy(dtype=object, na_value=None)
+    return [{"date": d, **dict(zip(cols, row))} for d, row in zip(dates, values.tolist())]
+
+
 def df_records(df) -> List[Dict[str, Any]]:
-    if df is None:
+    # Sparse symbols often return empty frames; skip the conversion entirely.
+    if df is None or getattr(df, "empty", False):
         return []
     try:
-        import pandas as pd  # type: ignore
         if isinstance(df.index, pd.DatetimeIndex):
-            df = df.copy()
-            df.insert(0, "date", df.index.astype(str))
-            df.reset_index(drop=True, inplace=True)
+            return _records_with_date(df)
         elif df.index.name and df.index.name not in df.columns:
             df = df.reset_index()
-        return json.loads(df.to_json(orient="records"))
+        # Straight to Python objects (no to_json/json.loads round-trip); NaN -> None
+        # so the records still serialize as JSON null.
+        return df.astype(object).where(df.notna(), None).to_dict(orient="records")
     except Exception:
         try:
-            return json.loads(df.to_json(orient="records"))
+            return loads(df.to_json(orient="records"))
         except Exception:
             return []
 
 
 def df_dict(df) -> Dict[str, Any]:
-    if df is None:
+    if df is None or getattr(df, "empty", False):
         return {}
     try:
-        return json.loads(df.to_json())  # default = columns/series
+        # Column/index labels are often Timestamps (statement periods); stringify
+        # them so the result stays JSON-serializable.
+        d = df.astype(object).where(df.notna(), None).to_dict()
+        return {str(k): {str(ik): v for ik, v in col.items()} for k, col in d.items()}
     except Exception:
         try:
-            return json.loads(df.to_json(orient="index"))
+            return loads(df.to_json(orient="index"))
         except Exception:
             return {}
 
 
-def parse_args(argv: List[str]) -> Dict[str, str]:
-    # Defaults
-    out: Dict[str, str] = {"symbol": "", "period": "1y", "interval": "1d", "all": "false", "provider": os.environ.get("PROVIDER", "yfinance")}
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(prog=Path(argv[0]).name if argv else None, description="Fetch Yahoo data for one symbol, or ingest stocklist.ts into SQLite.")
+    ap.add_argument("symbol", nargs="?", default="", type=str.upper)
+    ap.add_argument("--all", "-a", action="store_true", help="ingest every symbol in stocklist.ts")
+    ap.add_argument("--period", default="1y")
+    ap.add_argument("--interval", default="1d")
+    ap.add_argument("--provider", type=str.lower, choices=["yfinance", "yahooquery"], default=os.environ.get("PROVIDER", "yfinance"))
+    ap.add_argument("--initial-load", action="store_true", help="with --all: bulk-load via unindexed staging tables")
+    # Unknown flags were ignored by the previous hand-rolled parser; keep that.
+    args, _ = ap.parse_known_args(argv[1:])
     if len(argv) < 2:
         # No args -> run all by default
-        out["all"] = "true"
-        return out
-    # Parse flags and the first non-flag as symbol
-    i = 1
-    while i < len(argv):
-        part = argv[i]
-        if part in ("--all", "-a"):
-            out["all"] = "true"
-        elif part.startswith("--provider"):
-            k, _, v = part.partition("=")
-            if v:
-                out["provider"] = v.lower()
-            else:
-                if (i + 1) < len(argv):
-                    out["provider"] = argv[i + 1].lower()
-                    i += 1
-        elif part.startswith("--period"):
-            k, _, v = part.partition("=")
-            if v:
-                out["period"] = v
-            else:
-                out["period"] = argv[i + 1] if (i + 1) < len(argv) else out["period"]
-                if (i + 1) < len(argv):
-                    i += 1
-        elif part.startswith("--interval"):
-            k, _, v = part.partition("=")
-            if v:
-                out["interval"] = v
-            else:
-                out["interval"] = argv[i + 1] if (i + 1) < len(argv) else out["interval"]
-                if (i + 1) < len(argv):
-                    i += 1
-        elif not part.startswith("-") and not out["symbol"]:
-            out["symbol"] = part.upper()
-        i += 1
-    return out
+        args.all = True
+    return args
 
 
 def find_stocklist_path() -> Path | None:
@@ -150,6 +203,14 @@ def find_stocklist_path() -> Path | None:
     return None
 
 
+# One match per `{...}` object that has a symbol key; name (in either order) is
+# optional. Keys are anchored so 'mcsymbol'/'tlname' don't match.
+_STOCKLIST_ENTRY_RE = re.compile(
+    r"\{(?=[^{}]*?(?<!\w)symbol\s*:\s*'([^']*)')(?:(?=[^{}]*?(?<!\w)name\s*:\s*'([^']*)'))?",
+    re.I,
+)
+
+
 def load_symbols_from_stocklist() -> List[Tuple[str, str | None]]:
     """
     Returns list of (symbol, name) from stocklist.ts-like file.
@@ -159,23 +220,11 @@ def load_symbols_from_stocklist() -> List[Tuple[str, str | None]]:
     if not p:
         return []
     txt = p.read_text(encoding="utf-8", errors="ignore")
-    entries: List[Tuple[str, str | None]] = []
-    # Roughly split into object chunks and extract keys
-    import re
-    obj_re = re.compile(r"\{[^}]*\}", re.S | re.M)
-    # Anchor key names to avoid 'mcsymbol' matching 'symbol'
-    def get_val(chunk: str, key: str) -> str | None:
-        r = re.compile(rf"(?:^|[\s,{{]){key}\s*:\s*'([^']*)'", re.I)
-        m = r.search(chunk)
-        return m.group(1).strip() if m else None
-
-    for m in obj_re.finditer(txt):
-        ch = m.group(0)
-        sym = get_val(ch, "symbol")
-        name = get_val(ch, "name")
-        if sym:
-            entries.append((sym.upper(), name))
-    return entries
+    return [
+        (m.group(1).strip().upper(), m.group(2).strip() if m.group(2) is not None else None)
+        for m in _STOCKLIST_ENTRY_RE.finditer(txt)
+        if m.group(1).strip()
+    ]
 
 
 def resolve_db_path() -> Path:
@@ -199,6 +248,42 @@ def resolve_db_path() -> Path:
     return server_db
 
 
+def connect_db(db_path: Path) -> sqlite3.Connection:
+    """Open the DB tuned for bulk ingest.
+    WAL + synchronous=NORMAL turn per-transaction fsyncs into sequential
+    log appends; callers group each symbol's upserts into one transaction.
+    """
+    conn = sqlite3.connect(str(db_path), cached_statements=256)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")
+    # Allow bigger multi-row INSERTs (SQLite clamps this to its compile-time max).
+    if hasattr(conn, "setlimit"):
+        conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 32766)
+    return conn
+
+
+def insert_rows(cur: sqlite3.Cursor, sql_head: str, rows: List[Tuple[Any, ...]], sql_tail: str = "") -> int:
+    """Run `sql_head` + "VALUES (?,..),(?,..),..." + `sql_tail` over rows in chunks.
+    One statement per chunk (sized to the host-parameter limit) binds many rows
+    in a single VM run instead of one execution per row.
+    """
+    if not rows:
+        return 0
+    ncols = len(rows[0])
+    placeholder = "(" + ",".join("?" * ncols) + ")"
+    conn = cur.connection
+    max_vars = conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER) if hasattr(conn, "getlimit") else 999
+    step = max(1, max_vars // ncols)
+    total = 0
+    for i in range(0, len(rows), step):
+        chunk = rows[i:i + step]
+        cur.execute(sql_head + " VALUES " + ",".join([placeholder] * len(chunk)) + sql_tail, list(chain.from_iterable(chunk)))
+        total += cur.rowcount or 0
+    return total
+
+
 def ensure_db_schema(conn: sqlite3.Connection) -> None:
     cur = conn.cursor()
     cur.executescript(
@@ -277,12 +362,96 @@ def ensure_db_schema(conn: sqlite3.Connection) -> None:
     conn.commit()
 
 
-def upsert_prices(conn: sqlite3.Connection, symbol: str, rows: List[Dict[str, Any]]) -> int:
+# Upsert statements, built once; sqlite3's statement cache then reuses the
+# compiled plan for every symbol.
+# Multi-row upserts are split into head/conflict clause for insert_rows. ON
+# CONFLICT DO UPDATE rewrites the row in place (INSERT OR REPLACE deletes and
+# re-inserts it).
+_SQL_UPSERT_PRICES = "INSERT INTO prices(symbol,date,open,high,low,close,volume)"
+_SQL_UPSERT_PRICES_CONFLICT = (
+    " ON CONFLICT(symbol, date) DO UPDATE SET open=excluded.open, high=excluded.high,"
+    " low=excluded.low, close=excluded.close, volume=excluded.volume"
+)
+_SQL_UPSERT_STOCK = "INSERT INTO stocks(symbol, name) VALUES(?, ?) ON CONFLICT(symbol) DO UPDATE SET name=excluded.name"
+_SQL_UPSERT_YAHOO_INFO = (
+    "INSERT INTO yahoo_info(symbol, info, updated_at) VALUES(?, ?, ?)\n"
+    "ON CONFLICT(symbol) DO UPDATE SET info=excluded.info, updated_at=excluded.updated_at"
+)
+_SQL_UPSERT_YAHOO_ACTIONS = (
+    "INSERT INTO yahoo_actions(symbol, data, updated_at) VALUES(?, ?, ?)\n"
+    "ON CONFLICT(symbol) DO UPDATE SET data=excluded.data, updated_at=excluded.updated_at"
+)
+_SQL_UPSERT_YAHOO_MAJOR_HOLDERS = (
+    "INSERT INTO yahoo_major_holders(symbol, data, updated_at) VALUES(?, ?, ?)\n"
+    "ON CONFLICT(symbol) DO UPDATE SET data=excluded.data, updated_at=excluded.updated_at"
+)
+_SQL_UPSERT_YAHOO_FINANCIALS = (
+    "INSERT INTO yahoo_financials(symbol, income_statement, balance_sheet, cash_flow, updated_at) VALUES(?, ?, ?, ?, ?)\n"
+    "ON CONFLICT(symbol) DO UPDATE SET income_statement=excluded.income_statement, balance_sheet=excluded.balance_sheet, cash_flow=excluded.cash_flow, updated_at=excluded.updated_at"
+)
+_SQL_UPSERT_ACTIONS_ROWS = "INSERT INTO yahoo_actions_rows(symbol,date,dividend,split)"
+_SQL_UPSERT_ACTIONS_ROWS_CONFLICT = " ON CONFLICT(symbol, date) DO UPDATE SET dividend=excluded.dividend, split=excluded.split"
+_SQL_UPSERT_INSTITUTIONAL_HOLDERS = "INSERT INTO yahoo_institutional_holders(symbol,holder,report_date,pct_held,shares,value)"
+_SQL_UPSERT_MUTUAL_HOLDERS = "INSERT INTO yahoo_mutual_holders(symbol,holder,report_date,pct_held,shares,value)"
+_SQL_UPSERT_HOLDERS_CONFLICT = (
+    " ON CONFLICT(symbol, holder) DO UPDATE SET report_date=excluded.report_date,"
+    " pct_held=excluded.pct_held, shares=excluded.shares, value=excluded.value"
+)
+
+# --initial-load: rows are appended to these PK-less copies (no B-tree probe per
+# row) and merged into the real tables once, in key order, by finish_initial_load.
+# ORDER BY ... rowid keeps "last write wins" for keys staged more than once.
+_SQL_STAGE_PRICES = "INSERT INTO prices_stage(symbol,date,open,high,low,close,volume)"
+_SQL_STAGE_ACTIONS_ROWS = "INSERT INTO yahoo_actions_rows_stage(symbol,date,dividend,split)"
+_SQL_MERGE_STAGED_PRICES = (
+    _SQL_UPSERT_PRICES
+    + " SELECT symbol,date,open,high,low,close,volume FROM prices_stage WHERE true ORDER BY symbol, date, rowid"
+    + _SQL_UPSERT_PRICES_CONFLICT
+)
+_SQL_MERGE_STAGED_ACTIONS_ROWS = (
+    _SQL_UPSERT_ACTIONS_ROWS
+    + " SELECT symbol,date,dividend,split FROM yahoo_actions_rows_stage WHERE true ORDER BY symbol, date, rowid"
+    + _SQL_UPSERT_ACTIONS_ROWS_CONFLICT
+)
+
+_initial_load = False  # set between begin_initial_load() and finish_initial_load()
+
+
+def begin_initial_load(conn: sqlite3.Connection) -> None:
+    """Route price/action rows to fresh staging tables (same columns, no keys)."""
+    global _initial_load
+    conn.executescript(
+        """
+        DROP TABLE IF EXISTS prices_stage;
+        DROP TABLE IF EXISTS yahoo_actions_rows_stage;
+        CREATE TABLE prices_stage AS SELECT * FROM prices WHERE 0;
+        CREATE TABLE yahoo_actions_rows_stage AS SELECT * FROM yahoo_actions_rows WHERE 0;
+        """
+    )
+    _initial_load = True
+
+
+def finish_initial_load(conn: sqlite3.Connection) -> None:
+    """Merge the staging tables into prices/yahoo_actions_rows in one transaction and drop them."""
+    global _initial_load
+    _initial_load = False
+    try:
+        conn.execute(_SQL_MERGE_STAGED_PRICES)
+        conn.execute(_SQL_MERGE_STAGED_ACTIONS_ROWS)
+        conn.execute("DROP TABLE prices_stage")
+        conn.execute("DROP TABLE yahoo_actions_rows_stage")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def upsert_prices(cur: sqlite3.Cursor, symbol: str, rows: List[Dict[str, Any]]) -> int:
     if not rows:
         return 0
-    cur = conn.cursor()
-    cur.executemany(
-        "INSERT OR REPLACE INTO prices(symbol,date,open,high,low,close,volume) VALUES(?,?,?,?,?,?,?)",
+    return insert_rows(
+        cur,
+        _SQL_STAGE_PRICES if _initial_load else _SQL_UPSERT_PRICES,
         [
             (
                 symbol,
@@ -296,69 +465,70 @@ def upsert_prices(conn: sqlite3.Connection, symbol: str, rows: List[Dict[str, An
             for r in rows
             if r.get("date")
         ],
+        "" if _initial_load else _SQL_UPSERT_PRICES_CONFLICT,
     )
-    conn.commit()
-    return cur.rowcount or 0
 
 
-def upsert_stock(conn: sqlite3.Connection, symbol: str, name: str | None) -> None:
-    cur = conn.cursor()
+def upsert_prices_df(cur: sqlite3.Cursor, symbol: str, df) -> int:
+    """upsert_prices for a raw history DataFrame: columns are coerced in bulk
+    (missing/NaN -> 0, as in the dict path) instead of per-row float()/int().
+    """
+    if df is None or df.empty:
+        return 0
+    df = df.rename(columns=str.title)
+    ohlc = df.reindex(columns=["Open", "High", "Low", "Close"], fill_value=0.0).astype("float64").fillna(0.0)
+    vol = df.reindex(columns=["Volume"], fill_value=0)["Volume"].astype("float64").fillna(0.0).astype("int64")
+    dates = df.index.astype(str).str[:10].tolist()
+    o, h, l, c = ohlc.to_numpy().T.tolist()
+    rows = list(zip(repeat(symbol), dates, o, h, l, c, vol.tolist()))
+    if _initial_load:
+        return insert_rows(cur, _SQL_STAGE_PRICES, rows)
+    return insert_rows(cur, _SQL_UPSERT_PRICES, rows, _SQL_UPSERT_PRICES_CONFLICT)
+
+
+def upsert_stock(cur: sqlite3.Cursor, symbol: str, name: str | None) -> None:
     cur.execute(
-        "INSERT INTO stocks(symbol, name) VALUES(?, ?) ON CONFLICT(symbol) DO UPDATE SET name=excluded.name",
+        _SQL_UPSERT_STOCK,
         (symbol, name or symbol),
     )
-    conn.commit()
 
 
-def upsert_yahoo_info(conn: sqlite3.Connection, symbol: str, info: Dict[str, Any]) -> None:
-    cur = conn.cursor()
+def upsert_yahoo_info(cur: sqlite3.Cursor, symbol: str, info: Dict[str, Any], now: str | None = None) -> None:
     cur.execute(
-        "INSERT INTO yahoo_info(symbol, info, updated_at) VALUES(?, ?, ?)\n"
-        "ON CONFLICT(symbol) DO UPDATE SET info=excluded.info, updated_at=excluded.updated_at",
-        (symbol, json.dumps(info or {}), _now()),
+        _SQL_UPSERT_YAHOO_INFO,
+        (symbol, dumps(info or {}), now or _utcnow_iso()),
     )
-    conn.commit()
 
 
-def upsert_yahoo_actions(conn: sqlite3.Connection, symbol: str, data: List[Dict[str, Any]]) -> None:
-    cur = conn.cursor()
+def upsert_yahoo_actions(cur: sqlite3.Cursor, symbol: str, data: List[Dict[str, Any]], now: str | None = None) -> None:
     cur.execute(
-        "INSERT INTO yahoo_actions(symbol, data, updated_at) VALUES(?, ?, ?)\n"
-        "ON CONFLICT(symbol) DO UPDATE SET data=excluded.data, updated_at=excluded.updated_at",
-        (symbol, json.dumps(data or []), _now()),
+        _SQL_UPSERT_YAHOO_ACTIONS,
+        (symbol, dumps(data or []), now or _utcnow_iso()),
     )
-    conn.commit()
 
 
-def upsert_yahoo_major_holders(conn: sqlite3.Connection, symbol: str, data: List[Dict[str, Any]] | Dict[str, Any]) -> None:
+def upsert_yahoo_major_holders(cur: sqlite3.Cursor, symbol: str, data: List[Dict[str, Any]] | Dict[str, Any], now: str | None = None) -> None:
     # Accept list or dict and store as JSON
-    cur = conn.cursor()
     cur.execute(
-        "INSERT INTO yahoo_major_holders(symbol, data, updated_at) VALUES(?, ?, ?)\n"
-        "ON CONFLICT(symbol) DO UPDATE SET data=excluded.data, updated_at=excluded.updated_at",
-        (symbol, json.dumps(data or []), _now()),
+        _SQL_UPSERT_YAHOO_MAJOR_HOLDERS,
+        (symbol, dumps(data or []), now or _utcnow_iso()),
     )
-    conn.commit()
 
 
-def upsert_yahoo_financials(conn: sqlite3.Connection, symbol: str, income: Dict[str, Any], balance: Dict[str, Any], cash: Dict[str, Any]) -> None:
-    cur = conn.cursor()
+def upsert_yahoo_financials(cur: sqlite3.Cursor, symbol: str, income: Dict[str, Any], balance: Dict[str, Any], cash: Dict[str, Any], now: str | None = None) -> None:
     cur.execute(
-        "INSERT INTO yahoo_financials(symbol, income_statement, balance_sheet, cash_flow, updated_at) VALUES(?, ?, ?, ?, ?)\n"
-        "ON CONFLICT(symbol) DO UPDATE SET income_statement=excluded.income_statement, balance_sheet=excluded.balance_sheet, cash_flow=excluded.cash_flow, updated_at=excluded.updated_at",
-        (symbol, json.dumps(income or {}), json.dumps(balance or {}), json.dumps(cash or {}), _now()),
+        _SQL_UPSERT_YAHOO_FINANCIALS,
+        (symbol, dumps(income or {}), dumps(balance or {}), dumps(cash or {}), now or _utcnow_iso()),
     )
-    conn.commit()
 
 
-def _now() -> str:
-    return __import__('datetime').datetime.utcnow().isoformat()
+def _utcnow_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
 
 
-def upsert_actions_rows(conn: sqlite3.Connection, symbol: str, recs: List[Dict[str, Any]]) -> int:
+def upsert_actions_rows(cur: sqlite3.Cursor, symbol: str, recs: List[Dict[str, Any]]) -> int:
     if not recs:
         return 0
-    cur = conn.cursor()
     rows: List[Tuple[Any, ...]] = []
     for r in recs:
         d = str(r.get("date") or "")[:10]
@@ -377,78 +547,174 @@ def upsert_actions_rows(conn: sqlite3.Connection, symbol: str, recs: List[Dict[s
         rows.append((symbol, d, div_f, split_f))
     if not rows:
         return 0
-    cur.executemany(
-        "INSERT OR REPLACE INTO yahoo_actions_rows(symbol,date,dividend,split) VALUES(?,?,?,?)",
-        rows,
-    )
-    conn.commit()
-    return cur.rowcount or 0
-
-
-def _norm_holder_row(symbol: str, r: Dict[str, Any]) -> Tuple[str, str, str | None, float | None, int | None, float | None]:
-    holder = str(r.get("Holder") or r.get("holder") or r.get("name") or "").strip()
-    report_date = r.get("Date Reported") or r.get("date_reported") or r.get("date") or None
-    if report_date:
-        report_date = str(report_date)[:10]
-    pct = r.get("% Out") or r.get("pct_held") or r.get("Percent")
-    try: pct_f = float(pct)
-    except Exception: pct_f = None
-    shares = r.get("Shares") or r.get("shares")
-    try: shares_i = int(float(shares)) if shares is not None else None
-    except Exception: shares_i = None
-    value = r.get("Value") or r.get("value")
-    try: value_f = float(value) if value is not None else None
-    except Exception: value_f = None
-    return (symbol, holder, report_date, pct_f, shares_i, value_f)
-
-
-def upsert_institutional_holders(conn: sqlite3.Connection, symbol: str, recs: List[Dict[str, Any]]) -> int:
-    if not recs:
-        return 0
-    cur = conn.cursor()
-    rows = [_norm_holder_row(symbol, r) for r in recs if (r.get("Holder") or r.get("holder") or r.get("name"))]
+    if _initial_load:
+        return insert_rows(cur, _SQL_STAGE_ACTIONS_ROWS, rows)
+    return insert_rows(cur, _SQL_UPSERT_ACTIONS_ROWS, rows, _SQL_UPSERT_ACTIONS_ROWS_CONFLICT)
+
+
+def _action_records(df, key: str) -> List[Dict[str, Any]]:
+    """{"date", key} records from the first column of a yahooquery
+    dividends/splits slice, built column-wise rather than via iterrows()."""
+    dates = df.index.astype(str).str[:10].tolist()
+    vals = df.iloc[:, 0].to_numpy(dtype="float64").tolist()
+    return [{"date": d, key: v} for d, v in zip(dates, vals)]
+
+
+def _first_col(df, names: Tuple[str, ...]):
+    """First of `names` present in df as a Series, else None."""
+    for n in names:
+        if n in df.columns:
+            return df[n]
+    return None
+
+
+def _norm_holders_df(symbol: str, df) -> List[Tuple[str, str, str | None, float | None, int | None, float | None]]:
+    """(symbol, holder, report_date, pct_held, shares, value) rows for a holders
+    DataFrame, coerced column-wise; unparseable numbers become None."""
+    if df is None or df.empty:
+        return []
+    holder = _first_col(df, ("Holder", "holder", "name"))
+    if holder is None:
+        return []
+    holder = holder.fillna("").astype(str).str.strip()
+    keep = (holder != "").to_numpy()
+    df = df[keep]
+
+    def numeric(names: Tuple[str, ...]):
+        col = _first_col(df, names)
+        if col is None:
+            return [None] * len(df)
+        col = pd.to_numeric(col, errors="coerce").astype("float64")
+        return col.astype(object).where(col.notna(), None).tolist()
+
+    dates = _first_col(df, ("Date Reported", "date_reported", "date"))
+    if dates is None:
+        dates = [None] * len(df)
+    else:
+        dates = dates.astype(str).str[:10].astype(object).where(dates.notna(), None).tolist()
+    shares = [int(x) if x is not None else None for x in numeric(("Shares", "shares"))]
+    return list(zip(
+        repeat(symbol),
+        holder[keep].tolist(),
+        dates,
+        numeric(("% Out", "pct_held", "Percent")),
+        shares,
+        numeric(("Value", "value")),
+    ))
+
+
+def upsert_institutional_holders(cur: sqlite3.Cursor, symbol: str, df) -> int:
+    rows = _norm_holders_df(symbol, df)
     if not rows:
         return 0
-    cur.executemany(
-        "INSERT OR REPLACE INTO yahoo_institutional_holders(symbol,holder,report_date,pct_held,shares,value) VALUES(?,?,?,?,?,?)",
-        rows,
-    )
-    conn.commit()
-    return cur.rowcount or 0
+    return insert_rows(cur, _SQL_UPSERT_INSTITUTIONAL_HOLDERS, rows, _SQL_UPSERT_HOLDERS_CONFLICT)
 
 
-def upsert_mutual_holders(conn: sqlite3.Connection, symbol: str, recs: List[Dict[str, Any]]) -> int:
-    if not recs:
-        return 0
-    cur = conn.cursor()
-    rows = [_norm_holder_row(symbol, r) for r in recs if (r.get("Holder") or r.get("holder") or r.get("name"))]
+def upsert_mutual_holders(cur: sqlite3.Cursor, symbol: str, df) -> int:
+    rows = _norm_holders_df(symbol, df)
     if not rows:
         return 0
-    cur.executemany(
-        "INSERT OR REPLACE INTO yahoo_mutual_holders(symbol,holder,report_date,pct_held,shares,value) VALUES(?,?,?,?,?,?)",
-        rows,
+    return insert_rows(cur, _SQL_UPSERT_MUTUAL_HOLDERS, rows, _SQL_UPSERT_HOLDERS_CONFLICT)
+
+
+def yf_session(pool_size: int):
+    """One HTTP session shared by every yf.Ticker in a run, so TLS connections
+    and Yahoo cookies are reused across symbols instead of set up per ticker.
+    Prefers curl_cffi (yfinance's own backend); falls back to a pooled
+    requests.Session with retries. Returns None to let yfinance decide.
+    Caching sessions (requests_cache) are not used: yfinance rejects them.
+    """
+    try:
+        from curl_cffi import requests as curl_requests  # type: ignore
+        return curl_requests.Session(impersonate="chrome")
+    except Exception:
+        pass
+    try:
+        import requests  # type: ignore
+        from requests.adapters import HTTPAdapter  # type: ignore
+        from urllib3.util.retry import Retry  # type: ignore
+    except Exception:
+        return None
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504)),
     )
-    conn.commit()
-    return cur.rowcount or 0
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def fetch_yf_symbol(ysym: str, period: str, interval: str, session=None) -> Dict[str, Any]:
+    """Network half of the yfinance --all ingest (safe to run in a worker thread)."""
+    t = yf.Ticker(ysym, session=session)
+    hist = t.history(period=period, interval=interval)
+    info = getattr(t, "info", {}) or {}
+    actions = getattr(t, "actions", None)
+    major = getattr(t, "major_holders", None)
+    fin = getattr(t, "financials", None)
+    bal = getattr(t, "balance_sheet", None)
+    csh = getattr(t, "cashflow", None)
+    inst = getattr(t, "institutional_holders", None)
+    mf = getattr(t, "mutualfund_holders", None)
+
+    return {
+        "history": hist,
+        "info": info,
+        "actions": df_records(actions),
+        "major": major,
+        "financials": (df_dict(fin), df_dict(bal), df_dict(csh)),
+        "institutional": inst,
+        "mutual": mf,
+    }
+
+
+def persist_yf_symbol(cur: sqlite3.Cursor, ysym: str, name: str | None, payload: Dict[str, Any]) -> int:
+    """DB half of the yfinance --all ingest; returns price rows written. Caller commits."""
+    now = _utcnow_iso()
+    upsert_stock(cur, ysym, name)
+    n = upsert_prices_df(cur, ysym, payload["history"])
+    try: upsert_yahoo_info(cur, ysym, payload["info"], now)
+    except Exception: pass
+    try: upsert_actions_rows(cur, ysym, payload["actions"])
+    except Exception: pass
+    try: upsert_institutional_holders(cur, ysym, payload["institutional"])
+    except Exception: pass
+    try: upsert_mutual_holders(cur, ysym, payload["mutual"])
+    except Exception: pass
+    major = payload["major"]
+    try:
+        mh = df_records(major)
+        upsert_yahoo_major_holders(cur, ysym, mh, now)
+    except Exception:
+        try:
+            upsert_yahoo_major_holders(cur, ysym, df_dict(major), now)
+        except Exception:
+            pass
+    try:
+        upsert_yahoo_financials(cur, ysym, *payload["financials"], now=now)
+    except Exception:
+        pass
+    return n
 
 
 def main(argv: List[str]) -> None:
     args = parse_args(argv)
-    provider = args.get("provider", "yfinance").lower()
+    provider = (args.provider or "yfinance").lower()
     if provider not in ("yfinance", "yahooquery"):
         provider = "yfinance"
     ensure_deps(provider)
+    load_deps(provider)
 
-    # Defer imports until after ensure_deps
-    period = args["period"]
-    interval = args["interval"]
-    sym = args.get("symbol", "").strip()
-    do_all = args.get("all", "false").lower() == "true" or sym in ("ALL", "*")
+    period = args.period
+    interval = args.interval
+    sym = args.symbol.strip()
+    do_all = args.all or sym in ("ALL", "*")
+    initial_load = args.initial_load
 
     if provider == "yahooquery":
         # -------------- Yahooquery Implementation --------------
-        import pandas as pd  # type: ignore
-        from yahooquery import Ticker  # type: ignore
         if do_all:
             suffix = os.environ.get("TICKER_YAHOO_SUFFIX") or os.environ.get("YAHOO_SUFFIX") or ".NS"
             entries = load_symbols_from_stocklist()
@@ -456,11 +722,18 @@ def main(argv: List[str]) -> None:
                 fail("No symbols found in stocklist.ts")
             db_path = resolve_db_path()
             db_path.parent.mkdir(parents=True, exist_ok=True)
-            conn = sqlite3.connect(str(db_path))
+            conn = connect_db(db_path)
             ensure_db_schema(conn)
+            if initial_load:
+                begin_initial_load(conn)
+            cur = conn.cursor()
 
-            symbols = [ (base + suffix) if not base.endswith(suffix) else base for base, _ in entries ]
-            name_map = { (base + suffix) if not base.endswith(suffix) else base: name for base, name in entries }
+            symbols: List[str] = []
+            name_map: Dict[str, str | None] = {}
+            for base, name in entries:
+                ysym = base if base.endswith(suffix) else base + suffix
+                symbols.append(ysym)
+                name_map[ysym] = name
 
             # Batch request via yahooquery (single multi-symbol Ticker improves speed)
             t = Ticker(symbols, asynchronous=False)
@@ -494,20 +767,18 @@ def main(argv: List[str]) -> None:
                         else:
                             # Single symbol fallback
                             sdf = hist_df if symbol == symbols[0] else pd.DataFrame()
-                        sdf = sdf.copy()
-                        if not sdf.empty:
-                            sdf.insert(0, "date", sdf.index.astype(str))
-                        rows = df_records(sdf)
+                        rows = _records_with_date(sdf) if not sdf.empty else []
                         for r in rows:
                             if "date" in r:
                                 r["date"] = str(r["date"])[:10]
-                    upsert_stock(conn, symbol, name_map.get(symbol))
-                    n = upsert_prices(conn, symbol, rows)
+                    now = _utcnow_iso()
+                    upsert_stock(cur, symbol, name_map.get(symbol))
+                    n = upsert_prices(cur, symbol, rows)
                     total_rows += n
                     # Info / fundamentals
                     info_raw = modules_data.get(symbol, {}) if isinstance(modules_data, dict) else {}
                     try:
-                        upsert_yahoo_info(conn, symbol, info_raw)
+                        upsert_yahoo_info(cur, symbol, info_raw, now)
                     except Exception:
                         pass
                     # Financial statements (store into normalized financials table)
@@ -515,7 +786,7 @@ def main(argv: List[str]) -> None:
                     balance = info_raw.get("balanceSheetHistory", {})
                     cash = info_raw.get("cashflowStatementHistory", {})
                     try:
-                        upsert_yahoo_financials(conn, symbol, income, balance, cash)
+                        upsert_yahoo_financials(cur, symbol, income, balance, cash, now)
                     except Exception:
                         pass
                     # Dividends + Splits -> yahoo_actions_rows
@@ -529,8 +800,7 @@ def main(argv: List[str]) -> None:
                         else:
                             ddf = div_df if symbol == symbols[0] else pd.DataFrame()
                         if not ddf.empty:
-                            for idx, val in ddf.iterrows():
-                                action_rows.append({"date": str(idx)[:10], "Dividends": float(val.iloc[0]) if len(val) else float(val)})
+                            action_rows.extend(_action_records(ddf, "Dividends"))
                     if isinstance(spl_df, pd.DataFrame) and not spl_df.empty:
                         if isinstance(spl_df.index, pd.MultiIndex):
                             try:
@@ -540,28 +810,30 @@ def main(argv: List[str]) -> None:
                         else:
                             sdf2 = spl_df if symbol == symbols[0] else pd.DataFrame()
                         if not sdf2.empty:
-                            for idx, val in sdf2.iterrows():
-                                action_rows.append({"date": str(idx)[:10], "Stock Splits": float(val.iloc[0]) if len(val) else float(val)})
+                            action_rows.extend(_action_records(sdf2, "Stock Splits"))
                     try:
-                        upsert_actions_rows(conn, symbol, action_rows)
+                        upsert_actions_rows(cur, symbol, action_rows)
                     except Exception:
                         pass
+                    # One commit per symbol instead of one per upsert
+                    conn.commit()
                     total_symbols += 1
-                    print(json.dumps({"ok": True, "provider": "yahooquery", "symbol": symbol, "inserted": n}))
+                    print(dumps({"ok": True, "provider": "yahooquery", "symbol": symbol, "inserted": n}))
                 except Exception as e:
+                    conn.rollback()
                     err = f"{symbol}: {e}"
                     errors.append(err)
-                    print(json.dumps({"ok": False, "provider": "yahooquery", "symbol": symbol, "error": str(e)}), file=sys.stderr)
+                    print(dumps({"ok": False, "provider": "yahooquery", "symbol": symbol, "error": str(e)}), file=sys.stderr)
+            if initial_load:
+                finish_initial_load(conn)
             summary = {"ok": True, "mode": "all", "provider": "yahooquery", "symbols": total_symbols, "rows": total_rows, "errors": len(errors), "db": str(db_path)}
-            print(json.dumps(summary, ensure_ascii=False))
+            print(dumps(summary))
             return
         else:
             # Single symbol JSON via yahooquery
-            from yahooquery import Ticker  # type: ignore
             if not sym:
                 fail("Usage: python yfinance_fetch.py <SYMBOL> --provider yahooquery | --all")
             t = Ticker(sym)
-            import pandas as pd  # type: ignore
             hist_df = t.history(period=period, interval=interval)
             if isinstance(hist_df, pd.DataFrame) and not hist_df.empty:
                 if isinstance(hist_df.index, pd.MultiIndex):
@@ -569,9 +841,9 @@ def main(argv: List[str]) -> None:
                         hist_df = hist_df.xs(sym)
                     except Exception:
                         pass
-                hist_df = hist_df.copy()
-                hist_df.insert(0, "date", hist_df.index.astype(str))
-            history = df_records(hist_df)
+                history = _records_with_date(hist_df)
+            else:
+                history = df_records(hist_df)
             modules = ["price","summaryProfile","financialData","defaultKeyStatistics","assetProfile"]
             info_raw = t.get_modules(modules).get(sym, {})
             out = {
@@ -590,10 +862,9 @@ def main(argv: List[str]) -> None:
                     "cash_flow": info_raw.get("cashflowStatementHistory", {}),
                 },
             }
-            print(json.dumps(out, ensure_ascii=False))
+            write_json(out)
             return
     # -------------- Original yfinance logic (unchanged below except moved after new branch) --------------
-    import yfinance as yf  # type: ignore
     if not do_all and not sym:
         fail("Usage: python yfinance_fetch.py <SYMBOL> [--period 6mo] [--interval 1d] | --all", 2)
 
@@ -604,61 +875,49 @@ def main(argv: List[str]) -> None:
             fail("No symbols found in stocklist.ts")
         db_path = resolve_db_path()
         db_path.parent.mkdir(parents=True, exist_ok=True)
-        conn = sqlite3.connect(str(db_path))
+        conn = connect_db(db_path)
         ensure_db_schema(conn)
+        if initial_load:
+            begin_initial_load(conn)
+        cur = conn.cursor()
 
         total_symbols = 0
         total_rows = 0
         errors: List[str] = []
-        for base, name in entries:
-            ysym = f"{base}{suffix}" if not base.endswith(suffix) else base
+        targets = [(f"{base}{suffix}" if not base.endswith(suffix) else base, name) for base, name in entries]
+        workers = int(os.environ.get("YF_WORKERS", "12"))
+        session = yf_session(workers)
+
+        def fetch(ysym: str) -> Tuple[Dict[str, Any] | None, Exception | None]:
             try:
-                t = yf.Ticker(ysym)
-                hist = t.history(period=period, interval=interval)
-                info = getattr(t, "info", {}) or {}
-                actions = getattr(t, "actions", None)
-                major = getattr(t, "major_holders", None)
-                fin = getattr(t, "financials", None)
-                bal = getattr(t, "balance_sheet", None)
-                csh = getattr(t, "cashflow", None)
-                inst = getattr(t, "institutional_holders", None)
-                mf = getattr(t, "mutualfund_holders", None)
-
-                rows = df_records(hist)
-                for r in rows:
-                    if "date" in r:
-                        r["date"] = str(r["date"])[:10]
-                upsert_stock(conn, ysym, name)
-                n = upsert_prices(conn, ysym, rows)
-                try: upsert_yahoo_info(conn, ysym, info)
-                except Exception: pass
-                try: upsert_actions_rows(conn, ysym, df_records(actions))
-                except Exception: pass
-                try: upsert_institutional_holders(conn, ysym, df_records(inst))
-                except Exception: pass
-                try: upsert_mutual_holders(conn, ysym, df_records(mf))
-                except Exception: pass
-                try:
-                    mh = df_records(major)
-                    upsert_yahoo_major_holders(conn, ysym, mh)
-                except Exception:
-                    try:
-                        upsert_yahoo_major_holders(conn, ysym, df_dict(major))
-                    except Exception:
-                        pass
-                try:
-                    upsert_yahoo_financials(conn, ysym, df_dict(fin), df_dict(bal), df_dict(csh))
-                except Exception:
-                    pass
-                total_symbols += 1
-                total_rows += n
-                print(json.dumps({"ok": True, "provider": "yfinance", "symbol": ysym, "inserted": n}))
+                return fetch_yf_symbol(ysym, period, interval, session), None
             except Exception as e:
-                msg = f"{ysym}: {e}"
-                errors.append(msg)
-                print(json.dumps({"ok": False, "provider": "yfinance", "symbol": ysym, "error": str(e)}), file=sys.stderr)
+                return None, e
+
+        # Fetches are network-bound and run in worker threads; all SQLite writes
+        # stay on this thread. Chunking bounds how many fetched payloads wait in memory.
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            for i in range(0, len(targets), 50):
+                chunk = targets[i:i + 50]
+                for (ysym, name), (payload, err) in zip(chunk, ex.map(fetch, [ysym for ysym, _ in chunk])):
+                    try:
+                        if err is not None:
+                            raise err
+                        n = persist_yf_symbol(cur, ysym, name, payload)
+                        # One commit per symbol instead of one per upsert
+                        conn.commit()
+                        total_symbols += 1
+                        total_rows += n
+                        print(dumps({"ok": True, "provider": "yfinance", "symbol": ysym, "inserted": n}))
+                    except Exception as e:
+                        conn.rollback()
+                        msg = f"{ysym}: {e}"
+                        errors.append(msg)
+                        print(dumps({"ok": False, "provider": "yfinance", "symbol": ysym, "error": str(e)}), file=sys.stderr)
+        if initial_load:
+            finish_initial_load(conn)
         summary = {"ok": True, "mode": "all", "provider": "yfinance", "symbols": total_symbols, "rows": total_rows, "errors": len(errors), "db": str(db_path)}
-        print(json.dumps(summary, ensure_ascii=False))
+        print(dumps(summary))
         return
     else:
         try:
@@ -687,7 +946,7 @@ def main(argv: List[str]) -> None:
                     "cash_flow": df_dict(cash),
                 },
             }
-            print(json.dumps(out, ensure_ascii=False))
+            write_json(out)
         except Exception as e:
             fail(str(e))
 